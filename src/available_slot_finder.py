@@ -1,14 +1,35 @@
-import argparse
+import hashlib
+import heapq
+import json
 import os
-from itertools import combinations
-from datetime import datetime, timedelta
-from operator import itemgetter
+import re
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
+from typing import Optional
 
+DATE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = '%Y-%m-%d'
+# fixed-width ASCII-digit forms of the formats above, which can be parsed without strptime
+DATE_TIME_PATTERN = re.compile(r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d', re.ASCII)
+DATE_PATTERN = re.compile(r'\d{4}-\d\d-\d\d', re.ASCII)
+# break-even of the process pool start up on 2 CPUs for calendars of ~20 lines is at ~32 files
+PARALLEL_PARSING_MIN_CALENDARS = 64
 
-def parse_arguments():
+DateRange = tuple[int, int]  # (start, end) timestamps in seconds, both inclusive
+Event = tuple[int, int, int]  # (timestamp, change in blocking ranges, calendar index)
+
+
+def parse_arguments() -> tuple[str, int, int]:
     """Parse arguments provided by the user"""
 
+    import argparse  # imported only when run from the command line
+
     parser = argparse.ArgumentParser()
     parser.add_argument("-calendars", "--calendars",
                         help="Folder containing calendars", type=str, required=True)
@@ -32,13 +53,11 @@ def validate_calendars_path(calendars_path: Path) -> bool:
     return dir_exists
 
 
-def get_calendar_file_names(calendars_path, minimum_people):
+def get_calendar_file_names(calendars_path: str, minimum_people: int) -> list[str]:
     """Function returns file names for every calendar (*.txt file) specified in path provided by the user"""
 
-    files: list[str] = []
-    for file in os.listdir(calendars_path):
-        if file.endswith(".txt"):
-            files.append(file)
+    with os.scandir(calendars_path) as entries:
+        files = [entry.name for entry in entries if entry.name.endswith(".txt") and entry.is_file()]
 
     if len(files) == 0:
         raise Exception(f"Could not find any calendar (.txt file) in the path specified: {calendars_path}") from None
@@ -49,33 +68,88 @@ def get_calendar_file_names(calendars_path, minimum_people):
     return files
 
 
-def get_calendar_date_ranges(calendar_files, calendars):
-    """Function returns list of date ranges for each calendar"""
+def get_calendar_date_ranges(calendar_files: list[str], calendars: str,
+                             now: Optional[datetime] = None) -> dict[str, list[DateRange]]:
+    """Function returns list of date ranges, as (start, end) timestamps in seconds, for each calendar"""
+
+    if now is None:
+        now = datetime.now()
+    now_timestamp = int(now.timestamp())
+    paths = [os.path.join(calendars, file) for file in calendar_files]
+    if len(paths) >= PARALLEL_PARSING_MIN_CALENDARS and (os.cpu_count() or 1) > 1:
+        # parsing is CPU bound - spread calendars over processes once there are enough of them to pay off
+        with ProcessPoolExecutor() as executor:
+            date_ranges = list(executor.map(_parse_calendar_file, paths, repeat(now_timestamp), chunksize=8))
+    else:
+        date_ranges = [_parse_calendar_file(path, now_timestamp) for path in paths]
+
+    return dict(zip(calendar_files, date_ranges))
+
+
+def _parse_calendar_file(path: str, now: int) -> list[DateRange]:
+    """Function returns date ranges from a single calendar file that end after now (timestamp in seconds)"""
+
+    return [date_range for date_range in _load_calendar_file(path) if date_range[1] > now]
+
+
+def _load_calendar_file(path: str) -> list[DateRange]:
+    """Function returns all date ranges of a calendar file sorted by start - cached on disk until the file changes"""
 
-    calendar_date_ranges = {}
-    current_date = datetime.now()
-    for file in calendar_files:
-        with open(os.path.join(calendars, file), 'r') as f:
-            date_ranges = []
-            for line in f:
-                dates = line.strip('\n')
-                start_date_time_obj, end_date_time_obj = validate_date_range_format(dates)
-                if end_date_time_obj > current_date:  # keep ranges that end in the future
-                    date_ranges.append((start_date_time_obj, end_date_time_obj))
+    stat = os.stat(path)
+    # timestamps depend on the local timezone, so it is part of the key as well
+    cache_key = [stat.st_mtime_ns, stat.st_size, list(time.tzname)]
+    cache_file = _get_cache_dir() / f"{hashlib.sha1(os.path.abspath(path).encode()).hexdigest()}.json"
+    date_ranges = _read_cache_file(cache_file, cache_key)
+    if date_ranges is not None:
+        return date_ranges
 
-            calendar_date_ranges[file] = date_ranges
+    # parse the whole calendar in one pass
+    date_ranges = sorted(map(_parse_date_range_timestamps, Path(path).read_text().splitlines()))
 
-    return calendar_date_ranges
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        temporary_file = cache_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temporary_file, 'w') as f:
+            json.dump({'key': cache_key, 'date_ranges': date_ranges}, f)
+        os.replace(temporary_file, cache_file)
+    except OSError:
+        pass  # caching is best effort
+
+    return date_ranges
+
+
+def _read_cache_file(cache_file: Path, cache_key: list) -> Optional[list[DateRange]]:
+    """Function returns date ranges stored in cache_file for cache_key, or None if they are missing or invalid"""
+
+    try:
+        with open(cache_file, 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None  # missing or unreadable cache
 
+    if not isinstance(cached, dict) or cached.get('key') != cache_key:
+        return None
+    date_ranges = cached.get('date_ranges')
+    if not isinstance(date_ranges, list) or not all(
+            isinstance(date_range, list) and len(date_range) == 2 and all(type(t) is int for t in date_range)
+            for date_range in date_ranges):
+        return None
 
-def validate_date_range_format(dates):
+    return [(start, end) for start, end in date_ranges]
+
+
+def _get_cache_dir() -> Path:
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'available_slot_finder'
+
+
+def validate_date_range_format(dates: str) -> tuple[datetime, datetime]:
     date_string = dates.split(" - ")
     try:
-        start_date_time_obj = datetime.strptime(date_string[0], '%Y-%m-%d %H:%M:%S')
-        end_date_time_obj = datetime.strptime(date_string[1], '%Y-%m-%d %H:%M:%S')
+        start_date_time_obj = _parse_date_time(date_string[0])
+        end_date_time_obj = _parse_date_time(date_string[1])
     except ValueError:
         try:
-            entire_day_date_time_obj = datetime.strptime(date_string[0], '%Y-%m-%d')
+            entire_day_date_time_obj = _parse_date(date_string[0])
             start_date_time_obj = entire_day_date_time_obj.replace(hour=0, minute=0, second=0)
             end_date_time_obj = entire_day_date_time_obj.replace(hour=23, minute=59, second=59)
         except ValueError:
@@ -85,78 +159,144 @@ def validate_date_range_format(dates):
     return start_date_time_obj, end_date_time_obj
 
 
-def find_available_slot(calendar_date_ranges, duration_in_minutes, minimum_people):
-    """Function returns the closest available time slot of duration_in_minutes that is suitable for minimum_people"""
+@lru_cache(maxsize=100_000)
+def _parse_date_range_timestamps(dates: str) -> DateRange:
+    """Cached parsing of a date range line into timestamps - recurring date ranges are parsed only once"""
+
+    start_date_time_obj, end_date_time_obj = validate_date_range_format(dates)
+    return int(start_date_time_obj.timestamp()), int(end_date_time_obj.timestamp())
+
+
+def _parse_date_time(date_time_string: str) -> datetime:
+    """Parse date in DATE_TIME_FORMAT by reading its fixed-width fields, falling back to strptime"""
+
+    s = date_time_string
+    if DATE_TIME_PATTERN.fullmatch(s):
+        try:
+            return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]))
+        except ValueError:
+            pass
+
+    return datetime.strptime(s, DATE_TIME_FORMAT)
+
+
+def _parse_date(date_string: str) -> datetime:
+    """Parse date in DATE_FORMAT by reading its fixed-width fields, falling back to strptime"""
+
+    s = date_string
+    if DATE_PATTERN.fullmatch(s):
+        try:
+            return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+        except ValueError:
+            pass
+
+    return datetime.strptime(s, DATE_FORMAT)
+
+
+def find_available_slot(calendar_date_ranges: dict[str, list[DateRange]], duration_in_minutes: int, minimum_people: int,
+                        now: Optional[datetime] = None) -> datetime:
+    """Function returns the closest available time slot of duration_in_minutes that is suitable for minimum_people
+
+    calendar_date_ranges are lists of (start, end) timestamps sorted by start, as returned by get_calendar_date_ranges.
+    """
+
+    available_slot, _ = find_available_slot_and_calendars(calendar_date_ranges, duration_in_minutes, minimum_people,
+                                                          now)
+    return available_slot
+
+
+def find_available_slot_and_calendars(calendar_date_ranges: dict[str, list[DateRange]], duration_in_minutes: int,
+                                      minimum_people: int,
+                                      now: Optional[datetime] = None) -> tuple[datetime, list[str]]:
+    """Function returns the closest available time slot like find_available_slot, together with the calendars
+    available for the entire duration_in_minutes from that slot"""
+
+    if not 1 <= minimum_people <= len(calendar_date_ranges):
+        raise ValueError(f"minimum_people must be between 1 and the number of calendars ({len(calendar_date_ranges)}) "
+                         f"- {minimum_people} was given")
+
+    if now is None:
+        now = datetime.now()
+    now_timestamp = int(now.timestamp())
+    duration = duration_in_minutes * 60
+
+    # a date range [start, end] prevents a meeting from starting anywhere within (start - duration, end],
+    # so a meeting can start at a moment when at most (calendars - minimum_people) calendars are blocked
+    event_streams = [_get_blocking_events(date_ranges, duration, calendar)
+                     for calendar, date_ranges in enumerate(calendar_date_ranges.values())]
 
-    current_date_string = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    current_date = datetime.strptime(current_date_string, '%Y-%m-%d %H:%M:%S')
+    # merge events chronologically, unblocking before blocking at the same moment -
+    # merging lazily leaves events after the first available slot unmerged
+    events = heapq.merge(*event_streams)
 
-    comb = combinations(calendar_date_ranges, minimum_people)
-    for calendar_combination in comb:
-        #  find available slot within every possible calendar combination of len equal to minimum_people
-        date_ranges = []  # list combining all date ranges within given combination
+    calendars = list(calendar_date_ranges)
+    available_time_slot, blocked_calendars = _sweep(events, len(calendars) - minimum_people, now_timestamp)
+    available_calendars = [calendar for i, calendar in enumerate(calendars) if not blocked_calendars & (1 << i)]
 
-        for calendar in calendar_combination:
-            date_ranges.append(calendar_date_ranges[calendar])
+    return datetime.fromtimestamp(available_time_slot), available_calendars
 
-        # flatten multiple lists of ranges into one list
-        date_ranges = [date_range for date_ranges in date_ranges for date_range in date_ranges]
 
-        # sort date ranges based on range start
-        date_ranges = sorted(date_ranges, key=lambda tup: tup[0])
+def _get_blocking_events(date_ranges: list[DateRange], duration: int, calendar: int) -> list[Event]:
+    """Function returns sorted events of a calendar starting and stopping to block a meeting of duration seconds"""
 
-        if not bool(date_ranges):
-            # date_ranges is empty -> no restricting time range -> now is a good time for a meeting
-            return datetime.now()
+    events: list[Event] = []
+    for start, end in date_ranges:
+        start, end = start - duration + 1, end + 1
+        if events and start <= events[-1][0]:
+            # overlaps previous blocking range - extend it, so that every calendar blocks at most once at a time
+            events[-1] = (max(events[-1][0], end), -1, calendar)
+        else:
+            events.append((start, 1, calendar))
+            events.append((end, -1, calendar))
 
-        if date_ranges[0][0] > current_date:
-            # check if now will be suitable for a time slot
-            slot_time = date_ranges[0][0] - current_date
-            slot_time_in_minutes = slot_time.total_seconds() / 60
-            if slot_time_in_minutes > duration_in_minutes:
-                # current datetime is suitable for time slot
-                return datetime.now()
+    return events
 
-        # set initial time slot as a biggest datetime value from time ranges
-        available_time_slot = max(date_ranges, key=itemgetter(1))[1]
 
-        i = -1
-        shift = 0
-        while i < (len(date_ranges) - 2):
-            i += 1
-            if date_ranges[i + shift][0] < date_ranges[i + 1][0] and \
-                    date_ranges[i + shift][1] > date_ranges[i + 1][1]:
-                # next range is contained within previous range (skip range i+1, keep range i)
-                shift -= 1  # shift used to keep longer time range for further iterations
-            elif date_ranges[i + 1][0] < date_ranges[i + shift][1] < date_ranges[i + 1][1]:
-                # there is no available time slot (ranges intersect)
-                shift = 0
-                continue
-            else:
-                shift = 0
+def _sweep(events: Iterable[Event], max_blocked_calendars: int, now: int) -> tuple[int, int]:
+    """Function returns the earliest moment not before now at which at most max_blocked_calendars are blocked,
+    together with a bitmask of calendars blocked at that moment
 
-            time_slot_value = date_ranges[i + 1][0] - date_ranges[i + shift][1]
-            available_time_slot_in_minutes = time_slot_value.total_seconds() / 60
-            if available_time_slot_in_minutes > duration_in_minutes \
-                    and date_ranges[i + shift][1] < available_time_slot:
-                available_time_slot = date_ranges[i + shift][1]
-                break
+    events are sorted (timestamp, change, calendar index) tuples - change is 1 when a calendar starts blocking
+    and -1 when it stops. max_blocked_calendars must not be negative, so that a slot exists after the last event.
+    """
 
-    return available_time_slot + timedelta(seconds=1)
+    blocked_calendars = 0  # bit i is set while calendar i is blocked
+    available = True  # whether a meeting can start at available_time_slot
+    available_time_slot = now  # start of the current window in which a meeting can start
+    available_blocked_calendars = 0  # calendars blocked at available_time_slot
+    for event_time, change, calendar in events:
+        if available and event_time > available_time_slot:
+            # later events cannot change which calendars are blocked at available_time_slot
+            return available_time_slot, available_blocked_calendars
 
+        if change > 0:
+            blocked_calendars |= 1 << calendar
+            if bin(blocked_calendars).count('1') > max_blocked_calendars:
+                available = False
+        else:
+            blocked_calendars &= ~(1 << calendar)
+            if not available and bin(blocked_calendars).count('1') <= max_blocked_calendars:
+                available = True
+                available_time_slot = max(event_time, now)
 
+        if available:
+            available_blocked_calendars = blocked_calendars
 
+    return available_time_slot, available_blocked_calendars
 
 
-def main():
+def main() -> None:
     calendars_path, duration_in_minutes, minimum_people = parse_arguments()
     if not validate_calendars_path(Path(calendars_path)):
         return
 
     calendar_files = get_calendar_file_names(calendars_path, minimum_people)
-    calendar_date_ranges = get_calendar_date_ranges(calendar_files, calendars_path)
-    available_slot = find_available_slot(calendar_date_ranges, duration_in_minutes, minimum_people)
+    now = datetime.now()
+    calendar_date_ranges = get_calendar_date_ranges(calendar_files, calendars_path, now)
+    available_slot, available_calendars = find_available_slot_and_calendars(calendar_date_ranges,
+                                                                            duration_in_minutes, minimum_people, now)
     print(f"Closest available slot: {available_slot}")
+    print(f"Available calendars: {', '.join(available_calendars)}")
 
 
 if __name__ == '__main__':
@@ -1,14 +1,34 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
 import src.available_slot_finder
 from pathlib import Path
 from datetime import datetime
 
 
+def to_timestamps(calendar_date_ranges):
+    return {calendar: [(int(start.timestamp()), int(end.timestamp())) for start, end in date_ranges]
+            for calendar, date_ranges in calendar_date_ranges.items()}
+
+
 class Test(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         cls.duration_in_minutes = 30
         cls.minimum_people = 2
+        cls.five_people_now = datetime(2022, 5, 14, 8, 0, 0)
+        # p3, p4 and p5 are available from 8:15 until 8:44:59
+        cls.five_people_date_ranges = {
+            'p1.txt': [(datetime(2022, 5, 14, 8, 0, 0), datetime(2022, 5, 14, 8, 14, 59)),
+                       (datetime(2022, 5, 14, 8, 30, 0), datetime(2022, 5, 14, 9, 59, 59))],
+            'p2.txt': [(datetime(2022, 5, 14, 8, 0, 0), datetime(2022, 5, 14, 8, 29, 59))],
+            'p3.txt': [(datetime(2022, 5, 14, 8, 0, 0), datetime(2022, 5, 14, 8, 14, 59)),
+                       (datetime(2022, 5, 14, 8, 45, 0), datetime(2022, 5, 14, 9, 59, 59))],
+            'p4.txt': [(datetime(2022, 5, 14, 8, 0, 0), datetime(2022, 5, 14, 8, 14, 59))],
+            'p5.txt': [(datetime(2022, 5, 14, 8, 0, 0), datetime(2022, 5, 14, 8, 14, 59)),
+                       (datetime(2022, 5, 14, 8, 45, 0), datetime(2022, 5, 14, 9, 59, 59))],
+        }
 
     def test_validate_calendars_path_with_wrong_path_should_return_false(self):
         # given
@@ -25,6 +45,14 @@ class Test(unittest.TestCase):
         with self.assertRaises(ValueError):
             src.available_slot_finder.validate_date_range_format(wrong_date_range_format)
 
+    def test_validate_date_formats_malformed_fixed_width_date_should_raise_exception(self):
+        for wrong_date_range_format in ['2022-05-14 1 :00:00 - 2022-05-14 12:59:59',
+                                        '2_22-05-14 12:00:00 - 2022-05-14 12:59:59',
+                                        '+022-05-14 12:00:00 - 2022-05-14 12:59:59',
+                                        '2022-05-+4']:
+            with self.subTest(wrong_date_range_format), self.assertRaises(ValueError):
+                src.available_slot_finder.validate_date_range_format(wrong_date_range_format)
+
     def test_validate_date_range_formats_correct_two_part_date_range(self):
         # given
         date_range = '2022-05-14 12:00:00 - 2022-05-14 12:59:59'
@@ -41,6 +69,119 @@ class Test(unittest.TestCase):
         # then
         self.assertEqual(expected_result, src.available_slot_finder.validate_date_range_format(date_range))
 
+    def test_find_available_slot_returns_end_of_range_followed_by_long_enough_gap(self):
+        # given
+        calendar_date_ranges = {
+            'p1.txt': [(datetime(2000, 1, 1, 0, 0, 0), datetime(2099, 1, 1, 11, 59, 59)),
+                       (datetime(2099, 1, 1, 12, 20, 0), datetime(2099, 1, 1, 12, 59, 59))],
+            'p2.txt': [(datetime(2000, 1, 1, 0, 0, 0), datetime(2099, 1, 1, 12, 59, 59)),
+                       (datetime(2099, 1, 1, 13, 29, 0), datetime(2099, 1, 1, 13, 59, 59))],
+        }
+        expected_result = datetime(2099, 1, 1, 14, 0, 0)
+
+        # then
+        self.assertEqual(expected_result, src.available_slot_finder.find_available_slot(
+            to_timestamps(calendar_date_ranges), self.duration_in_minutes, self.minimum_people))
+
+    def test_find_available_slot_returns_now_when_nobody_is_busy_for_duration(self):
+        # given
+        now = datetime(2022, 5, 14, 11, 0, 0)
+        calendar_date_ranges = {
+            'p1.txt': [(datetime(2022, 5, 14, 11, 30, 0), datetime(2022, 5, 14, 11, 59, 59))],
+            'p2.txt': [(datetime(2022, 5, 14, 10, 0, 0), datetime(2022, 5, 14, 10, 59, 59))],
+        }
+
+        # then
+        self.assertEqual(now, src.available_slot_finder.find_available_slot(
+            to_timestamps(calendar_date_ranges), self.duration_in_minutes, self.minimum_people, now))
+
+    def test_find_available_slot_three_of_five_people(self):
+        # given
+        expected_result = (datetime(2022, 5, 14, 8, 15, 0), ['p3.txt', 'p4.txt', 'p5.txt'])
+
+        # then
+        self.assertEqual(expected_result, src.available_slot_finder.find_available_slot_and_calendars(
+            to_timestamps(self.five_people_date_ranges), self.duration_in_minutes, 3, self.five_people_now))
+
+    def test_find_available_slot_requires_the_same_people_for_entire_duration(self):
+        # given
+        calendar_date_ranges = {
+            **self.five_people_date_ranges,
+            # p5 becomes busy 5 minutes earlier than p3
+            'p5.txt': [(datetime(2022, 5, 14, 8, 0, 0), datetime(2022, 5, 14, 8, 14, 59)),
+                       (datetime(2022, 5, 14, 8, 40, 0), datetime(2022, 5, 14, 9, 59, 59))],
+        }
+        # from 8:15 three people are available at every moment, but never the same three for 30 minutes
+        expected_result = datetime(2022, 5, 14, 10, 0, 0)
+
+        # then
+        self.assertEqual(expected_result, src.available_slot_finder.find_available_slot(
+            to_timestamps(calendar_date_ranges), self.duration_in_minutes, 3, self.five_people_now))
+
+    def test_find_available_slot_with_minimum_people_out_of_range_should_raise_exception(self):
+        # given
+        now = datetime(2022, 5, 14, 8, 0, 0)
+        calendar_date_ranges = to_timestamps({
+            'p1.txt': [(datetime(2022, 5, 14, 8, 0, 0), datetime(2022, 5, 14, 8, 59, 59))],
+        })
+
+        # then
+        for minimum_people in [0, 2]:
+            with self.subTest(minimum_people), self.assertRaises(ValueError):
+                src.available_slot_finder.find_available_slot(
+                    calendar_date_ranges, self.duration_in_minutes, minimum_people, now)
+
+    def test_get_calendar_date_ranges_reparses_calendar_changed_since_cached(self):
+        with tempfile.TemporaryDirectory() as calendars, tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_dir}):
+            # given
+            now = datetime(2022, 5, 14, 8, 0, 0)
+            calendar = Path(calendars, 'p1.txt')
+            calendar.write_text('2022-05-14 12:00:00 - 2022-05-14 12:59:59\n')
+            src.available_slot_finder.get_calendar_date_ranges(['p1.txt'], calendars, now)
+
+            # when
+            calendar.write_text('2022-05-14\n')
+            os.utime(calendar, ns=(0, 0))
+
+            # then
+            expected_result = to_timestamps({'p1.txt': [(datetime(2022, 5, 14, 0, 0, 0),
+                                                         datetime(2022, 5, 14, 23, 59, 59))]})
+            self.assertEqual(expected_result,
+                             src.available_slot_finder.get_calendar_date_ranges(['p1.txt'], calendars, now))
+
+    def test_get_calendar_date_ranges_reuses_cached_calendar_without_parsing(self):
+        with tempfile.TemporaryDirectory() as calendars, tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_dir}):
+            # given
+            now = datetime(2022, 5, 14, 8, 0, 0)
+            Path(calendars, 'p1.txt').write_text('2022-05-14 12:00:00 - 2022-05-14 12:59:59\n')
+            expected_result = src.available_slot_finder.get_calendar_date_ranges(['p1.txt'], calendars, now)
+
+            # when
+            with mock.patch('src.available_slot_finder._parse_date_range_timestamps') as parse_date_range:
+                result = src.available_slot_finder.get_calendar_date_ranges(['p1.txt'], calendars, now)
+
+            # then
+            parse_date_range.assert_not_called()
+            self.assertEqual(expected_result, result)
+
+    def test_get_calendar_date_ranges_reparses_calendar_with_damaged_cache(self):
+        with tempfile.TemporaryDirectory() as calendars, tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_dir}):
+            # given
+            now = datetime(2022, 5, 14, 8, 0, 0)
+            Path(calendars, 'p1.txt').write_text('2022-05-14 12:00:00 - 2022-05-14 12:59:59\n')
+            expected_result = src.available_slot_finder.get_calendar_date_ranges(['p1.txt'], calendars, now)
+
+            # when
+            for cache_file in Path(cache_dir, 'available_slot_finder').iterdir():
+                cache_file.write_text('{"key": [1, 2')
+
+            # then
+            self.assertEqual(expected_result,
+                             src.available_slot_finder.get_calendar_date_ranges(['p1.txt'], calendars, now))
+
 
 if __name__ == '__main__':
     unittest.main()